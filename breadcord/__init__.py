@@ -1,3 +1,31 @@
-from . import config, errors, helpers, module
-from .bot import Bot
-from .module import Module, ModuleCog
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from . import config, errors, helpers, module
+    from .bot import Bot
+    from .module import Module, ModuleCog
+
+# Submodules are imported on first access, so that e.g. parsing CLI arguments doesn't have to import discord.py
+_lazy_attributes = {
+    'config': ('.config', None),
+    'errors': ('.errors', None),
+    'helpers': ('.helpers', None),
+    'module': ('.module', None),
+    'Bot': ('.bot', 'Bot'),
+    'Module': ('.module', 'Module'),
+    'ModuleCog': ('.module', 'ModuleCog'),
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _lazy_attributes:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module_name, attribute = _lazy_attributes[name]
+    value = importlib.import_module(module_name, __name__)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
@@ -1,8 +1,6 @@
 import argparse
 from pathlib import Path
 
-from .bot import Bot
-
 parser = argparse.ArgumentParser(prog='breadcord')
 parser.add_argument(
     '-d', '--data',
@@ -53,6 +51,7 @@ if args.ui:
     from .app import Breadcord
     app = Breadcord(args=args)
 else:
+    from .bot import Bot
     app = Bot(args=args)
 
 if __name__ == '__main__':
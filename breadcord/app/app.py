@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import itertools
 import logging
 import sys
+import threading
 from asyncio import CancelledError
 from typing import TYPE_CHECKING, ClassVar
 
@@ -19,21 +21,34 @@ _logger = logging.getLogger('breadcord.app')
 
 
 class TUIHandler(logging.Handler):
+    # Stored tracebacks keep every frame and its locals alive, so only the most recent ones can be inspected
+    max_exceptions = 256
+
     def __init__(self, tui_app: Breadcord):
         super().__init__()
         self.tui = tui_app
         self.exceptions: dict[int, tuple[type[BaseException], BaseException, TracebackType | None]] = {}
-        self._record_id = 0
+        self._next_id = itertools.count().__next__
 
     def allocate_id(self) -> int:
-        allocated = self._record_id
-        self._record_id += 1
-        return allocated
+        return self._next_id()
 
     def emit(self, record: logging.LogRecord) -> None:
-        log_id = self.allocate_id()
+        # Widgets may only be updated from the app's thread, so records logged from other threads are handed over.
+        # Unlike App.call_from_thread this doesn't wait, since the app thread could be blocked on this handler's lock.
+        # noinspection PyProtectedMember
+        if self.tui._thread_id != threading.get_ident():
+            # noinspection PyProtectedMember
+            if (loop := self.tui._loop) is not None:
+                loop.call_soon_threadsafe(self.emit, record)
+            return
+
+        log_id = self._next_id()
         if record.exc_info is not None:
             self.exceptions[log_id] = record.exc_info
+            if len(self.exceptions) > self.max_exceptions:
+                # IDs only ever increase, so the first key is the oldest
+                del self.exceptions[next(iter(self.exceptions))]
         self.format(record)
         self.tui.output_log.add_record(log_id, record)
 
@@ -51,6 +66,7 @@ class Breadcord(app.App):
         self.handler = TUIHandler(self)
         self.output_log: TableLog | None = None
         self.bot_worker: worker.Worker | None = None
+        self._header_title: ColouredHeaderTitle | None = None
         self._online = False
 
     def compose(self) -> app.ComposeResult:
@@ -63,6 +79,8 @@ class Breadcord(app.App):
         yield widgets.Footer()
 
     def on_mount(self) -> None:
+        # noinspection PyTypeChecker
+        self._header_title = self.query_one('HeaderTitle', expect_type=ColouredHeaderTitle)
         self.online = False
         self.console.set_window_title('Breadcord TUI')
         self.bot_worker = self.start_bot()
@@ -73,8 +91,9 @@ class Breadcord(app.App):
 
     @online.setter
     def online(self, value: bool) -> None:
-        # noinspection PyTypeChecker
-        header_title = self.query_one('HeaderTitle', expect_type=ColouredHeaderTitle)
+        header_title = self._header_title
+        if value == self._online and header_title.sub_text:
+            return
         previous = 'Offline' if isinstance(header_title.sub_text, str) else header_title.sub_text.plain
 
         if value:
@@ -91,15 +110,17 @@ class Breadcord(app.App):
 
     @work(exclusive=True)
     async def start_bot(self) -> None:
-        bot = Bot(tui_app=self, args=self.args)
+        bot = None
         try:
+            # Modules are discovered while the bot is created, so a broken manifest can already fail here
+            bot = Bot(tui_app=self, args=self.args)
             await bot.start()
         except CancelledError:
             _logger.info('Interrupt received')
         except:  # noqa: E722
             sys.excepthook(*sys.exc_info())
         finally:
-            if not bot.is_closed():
+            if bot is not None and not bot.is_closed():
                 await bot.close()
 
     def on_worker_state_changed(self, event: worker.Worker.StateChanged) -> None:
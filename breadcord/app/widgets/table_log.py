@@ -54,6 +54,7 @@ class TableLog(DataTable):
     def __init__(self, handler: TUIHandler, **kwargs):
         super().__init__(**kwargs)
         self.handler = handler
+        self._component_classes: dict[str, str] = {}
         self.add_column('Time', key='time')
         self.add_column('Level', key='level', width=8)
         self.add_column('Source', key='source')
@@ -66,21 +67,27 @@ class TableLog(DataTable):
             return Strip.blank(self.size.width, base_style)
 
         if row_key.value is not None:
-            component_class = f'tablelog--{self.get_row(row_key)[1].lower()}'
-            if component_class not in self.COMPONENT_CLASSES:
-                component_class = 'tablelog--unknown'
-            base_style = self.get_component_rich_style(component_class)
+            base_style = self.get_component_rich_style(self._component_classes[row_key.value])
 
         return super()._render_line(y, x1, x2, base_style)
 
     def add_record(self, record_id: int, record: LogRecord):
+        key = str(record_id)
+        # Worked out once here, since rows are re-rendered far more often than they are added
+        component_class = f'tablelog--{record.levelname.lower()}'
+        if component_class not in self.COMPONENT_CLASSES:
+            component_class = 'tablelog--unknown'
+        self._component_classes[key] = component_class
+
+        message = record.message
         self.add_row(
             record.asctime.split()[1],
             record.levelname,
             record.name,
-            record.message,
-            key=str(record_id),
-            height=record.message.count('\n') + 1,
+            message,
+            key=key,
+            # Most records are a single line, which a membership check settles without counting
+            height=message.count('\n') + 1 if '\n' in message else 1,
         )
 
         if round(self.max_scroll_y - self.scroll_y) <= 1:
@@ -5,7 +5,13 @@ import importlib.machinery
 import importlib.util
 import inspect
 import logging
+import logging.handlers
+import os
+import queue
+import re
+import stat
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
@@ -15,8 +21,8 @@ from discord.ext import commands
 from discord.ext.commands.view import StringView
 
 from . import config, errors
-from .helpers import IndentFormatter
-from .module import Module, Modules, global_modules
+from .helpers import IndentFormatter, LocalQueueHandler, TimedMemoryHandler
+from .module import Module, Modules, find_modules, global_modules
 
 if TYPE_CHECKING:
     from argparse import Namespace
@@ -27,6 +33,8 @@ if TYPE_CHECKING:
 
 _logger = logging.getLogger('breadcord.bot')
 module_path = Path(__file__).parent
+settings_schema_path = module_path / 'settings_schema.toml'
+core_modules_path = module_path / 'core_modules'
 
 
 class CommandTree(discord.app_commands.CommandTree):
@@ -52,6 +60,10 @@ class Bot(commands.Bot):
         self.settings = config.SettingsGroup('settings', observers={})
         self.ready = False
         self._new_data_dir = False
+        self._application_owners: tuple[float, frozenset[int]] | None = None
+        self._log_listener: logging.handlers.QueueListener | None = None
+        self._lowered_prefixes: dict[tuple[str, ...], tuple[str, ...]] = {}
+        self._owns_loop = False
 
         data_dir = self.args.data_dir or Path('data')
         if not data_dir.is_dir():
@@ -59,23 +71,42 @@ class Bot(commands.Bot):
             data_dir.mkdir()
         self.data_dir = data_dir.resolve()
 
-        logs_dir = self.args.logs_dir or self.data_dir / 'logs'
-        logs_dir.mkdir(exist_ok=True)
-        self.logs_dir = logs_dir.resolve()
+        # Defaults live under the data directory, which is already resolved, so only user supplied paths need resolving.
+        # Directories are checked before creating them, since mkdir on an existing directory costs a stat on top anyway
+        self.logs_dir = self.args.logs_dir.resolve() if self.args.logs_dir else self.data_dir / 'logs'
+        if not self.logs_dir.is_dir():
+            self.logs_dir.mkdir(exist_ok=True)
 
-        modules_dir = self.data_dir / 'modules'
-        modules_dir.mkdir(exist_ok=True)
-        self.modules_dir = modules_dir.resolve()
+        self.modules_dir = self.data_dir / 'modules'
+        if not self.modules_dir.is_dir():
+            self.modules_dir.mkdir(exist_ok=True)
 
-        storage_dir = self.args.storage_dir or self.data_dir / 'storage'
-        storage_dir.mkdir(exist_ok=True)
-        self.storage_dir = storage_dir.resolve()
+        self.storage_dir = self.args.storage_dir.resolve() if self.args.storage_dir else self.data_dir / 'storage'
+        if not self.storage_dir.is_dir():
+            self.storage_dir.mkdir(exist_ok=True)
 
-        self.settings_file = (self.args.setting_file or self.data_dir / 'settings.toml').resolve()
+        self.settings_file = (
+            self.args.setting_file.resolve() if self.args.setting_file else self.data_dir / 'settings.toml'
+        )
 
+        # Gateway intents can't be changed once the client is created, and modules declare the intents they need in
+        # their manifests, so modules are found before that. They are only added to self.modules in setup_hook.
+        working_dir = Path().resolve()
+        search_paths: list[tuple[Path, Path]] = [(path.resolve(), working_dir) for path in self.args.module_dirs]
+        search_paths.append((core_modules_path, module_path.parent))
+        search_paths.append((self.modules_dir, working_dir))
+        self._found_modules: list[Module] = [
+            module
+            for search_path, import_relative_to in search_paths
+            for module in find_modules(self, search_path, import_relative_to)
+        ]
+
+        intents = discord.Intents.default()
+        intents.message_content = True
+        intents.value |= self._enabled_module_intents().value
         super().__init__(
             command_prefix=[],
-            intents=discord.Intents.all(),
+            intents=intents,
             tree_cls=CommandTree,
         )
 
@@ -88,34 +119,49 @@ class Bot(commands.Bot):
             _logger.critical(f'Uncaught {exc_type.__name__}: {value}', exc_info=(exc_type, value, traceback))
         sys.excepthook = handle_exception
 
+        # Console and file output is handled on a background thread so that it never blocks the event loop
+        root_handlers: list[logging.Handler] = []
+        log_handlers: list[logging.Handler] = []
         if self.tui is None:
+            console_handler = logging.StreamHandler()
             # noinspection PyProtectedMember
-            discord.utils.setup_logging(formatter=IndentFormatter(discord.utils._ColourFormatter()))
+            console_handler.setFormatter(IndentFormatter(discord.utils._ColourFormatter()))
+            log_handlers.append(console_handler)
         else:
-            discord.utils.setup_logging(handler=self.tui.handler)
-
-        log_file = self.logs_dir / 'breadcord_latest.log'
-        if log_file.is_file():
-            with log_file.open(encoding='utf-8') as file:
-                timestamp = file.read(10)
-            try:
-                datetime.strptime(timestamp, '%Y-%m-%d')
-            except ValueError:
-                timestamp = '0000-00-00'
-            base_filename = timestamp + '.{}.log'
-            log_number = 1
-            while (rename_path := self.logs_dir / base_filename.format(log_number)).is_file():
-                log_number += 1
-            log_file.rename(rename_path)
-
-        discord.utils.setup_logging(
-            handler=logging.FileHandler(log_file, 'w', encoding='utf-8'),
-            formatter=IndentFormatter(logging.Formatter(
+            # The TUI has to be updated from the event loop, and doesn't do any IO anyway
+            self.tui.handler.setFormatter(logging.Formatter(
                 fmt='{asctime} [{levelname}] {name}: {message}',
                 datefmt='%Y-%m-%d %H:%M:%S',
                 style='{',
-            )),
-        )
+            ))
+            root_handlers.append(self.tui.handler)
+
+        file_handler = logging.FileHandler(self.logs_dir / 'breadcord_latest.log', 'w', encoding='utf-8')
+        file_handler.setFormatter(IndentFormatter(logging.Formatter(
+            fmt='{asctime} [{levelname}] {name}: {message}',
+            datefmt='%Y-%m-%d %H:%M:%S',
+            style='{',
+        )))
+        # Records are written in batches rather than one write per record, but errors still go out immediately
+        log_handlers.append(TimedMemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=file_handler))
+
+        log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        self._log_listener = logging.handlers.QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+        self._log_listener.start()
+        root_handlers.append(LocalQueueHandler(log_queue))
+        logging.basicConfig(level=logging.INFO, handlers=root_handlers, force=True)
+
+    def _rotate_log_file(self) -> None:
+        log_file = self.logs_dir / 'breadcord_latest.log'
+        try:
+            # Dated by when the log was last written to, which doesn't depend on what the first line looks like
+            timestamp = datetime.fromtimestamp(log_file.stat().st_mtime).strftime('%Y-%m-%d')
+        except FileNotFoundError:
+            return
+        rotated_log_name = re.compile(rf'{re.escape(timestamp)}\.(\d+)\.log')
+        with os.scandir(self.logs_dir) as entries:
+            log_numbers = [int(match[1]) for entry in entries if (match := rotated_log_name.fullmatch(entry.name))]
+        log_file.rename(self.logs_dir / f'{timestamp}.{max(log_numbers, default=0) + 1}.log')
 
     async def on_command_error(
         self,
@@ -128,65 +174,86 @@ class Bot(commands.Bot):
         _logger.exception(f'{exception.__class__.__name__}: {exception}', exc_info=exception)
 
     async def start(self, *_, **__) -> None:
+        # The TUI shares this event loop, so disk work is kept off it where possible
+        await asyncio.to_thread(self._rotate_log_file)
         self._init_logging()
 
         if self._new_data_dir:
             _logger.info('Creating new data directory in current location')
 
-        if not self.settings_file.is_file():
+        _logger.info(f'Loading settings from {self.settings_file.as_posix()}')
+        try:
+            data = await asyncio.to_thread(config.load_toml, self.settings_file)
+        except FileNotFoundError:
             _logger.info('Generating missing settings.toml file')
-            self.settings = config.SettingsGroup('settings', schema_path=module_path / 'settings_schema.toml')
+            self.settings = config.SettingsGroup('settings', schema_path=settings_schema_path)
             _logger.warning('Bot token must be supplied to start the bot')
             self.ready = True
             await self.close()
             return
 
-        self.load_settings()
+        self._apply_settings(data)
         if self.settings.debug.value:
             logging.getLogger().setLevel(logging.DEBUG)
             _logger.debug('Debug mode enabled')
             logging.getLogger('discord').setLevel(logging.INFO)
-        self.command_prefix = commands.when_mentioned_or(*self.settings.command_prefixes.value)
-        self.owner_ids = set(self.settings.administrators.value)
+        self._apply_command_prefixes(self.settings.command_prefixes.value)
+        self._apply_administrators(self.settings.administrators.value)
+
+        # Most event handlers finish without ever suspending, eager tasks let them run without a trip through the loop.
+        # This is only done when the loop was created by run(), since other loops (e.g. the TUI's) aren't ours to change
+        if self._owns_loop and hasattr(asyncio, 'eager_task_factory'):
+            asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
 
         await super().start(token=self.settings.token.value)
 
     def run(self, **kwargs) -> None:
+        self._owns_loop = True
         super().run(token='', log_handler=None, **kwargs)
 
     async def setup_hook(self) -> None:
-        for unresolved_path in self.args.module_dirs:
-            path = unresolved_path.resolve()
-            _logger.info(f'Extra module path: {path.as_posix()}')
-            relative_path = path.relative_to(Path().resolve())
-            self.modules.discover(self, search_path=relative_path)
-
-        _logger.debug('Finding core modules')
-        self.modules.discover(self, search_path=module_path / 'core_modules', import_relative_to=module_path.parent)
-
-        _logger.debug(f'Finding user modules ({self.modules_dir.as_posix()})')
-        self.modules.discover(self, search_path=self.modules_dir)
+        if extra_paths := [path.resolve().as_posix() for path in self.args.module_dirs]:
+            _logger.info('Extra module paths: ' + ', '.join(extra_paths))
+        # Modules were found before the client was created, but are only added now that logging has been set up
+        for module in self._found_modules:
+            _logger.debug(f'Discovered module: {module.import_string}')
+            self.modules.add(module)
+        self._found_modules.clear()
+
+        not_requested = [name for name in ('members', 'presences') if not getattr(self.intents, name)]
+        if not_requested:
+            _logger.info(
+                f'Privileged intents are no longer requested by default, not requesting: {", ".join(not_requested)}. '
+                'Modules which need them must declare them in their manifest.',
+            )
 
-        for loaf in self.modules_dir.glob('*.loaf'):
-            _logger.info(f'Loaf pending install: {loaf.name}')
-            self.modules.install_loaf(self, loaf_path=loaf, install_path=self.modules_dir, delete_source=True)
+        with os.scandir(self.modules_dir) as entries:
+            loaves = [entry for entry in entries if entry.name.endswith('.loaf') and entry.is_file()]
+        if loaves:
+            _logger.info('Loaves pending install: ' + ', '.join(loaf.name for loaf in loaves))
+        for loaf in loaves:
+            self.modules.install_loaf(self, loaf_path=loaf.path, install_path=self.modules_dir, delete_source=True)
 
         await self.load_modules()
 
         @self.settings.command_prefixes.observe
         def on_command_prefixes_changed(_, new: list[str]) -> None:
-            self.command_prefix = commands.when_mentioned_or(*new)
+            self._apply_command_prefixes(new)
 
         @self.settings.administrators.observe
         def on_administrators_changed(_, new: list[int]) -> None:
-            self.owner_ids = set(new)
+            self._apply_administrators(new)
+
+    def _apply_command_prefixes(self, prefixes: list[str]) -> None:
+        self.command_prefix = commands.when_mentioned_or(*prefixes)
+        self._lowered_prefixes.clear()
+
+    def _apply_administrators(self, user_ids: list[int]) -> None:
+        self.owner_ids = frozenset(user_ids)
 
     async def load_modules(self) -> None:
         modules: list[str] = self.settings.modules.value
-        unique_modules: list[str] = []
-        for m in modules:
-            if m not in unique_modules:
-                unique_modules.append(m)
+        unique_modules: list[str] = list(dict.fromkeys(modules))
 
         if len(modules) != len(unique_modules):
             _logger.warning(
@@ -214,6 +281,22 @@ class Bot(commands.Bot):
         if failed:
             _logger.warning('Failed to load modules: ' + ', '.join(module.id for module in failed))
 
+    def _enabled_module_intents(self) -> discord.Intents:
+        """Get the gateway intents declared in the manifests of the modules enabled in the settings file."""
+        intents = discord.Intents.none()
+        try:
+            enabled = set(config.load_toml(self.settings_file).get('modules', ()))
+        except (OSError, ValueError):
+            # Any problems with the settings file are reported once the bot is started
+            return intents
+
+        for module in self._found_modules:
+            # The first module found with an ID is the one that gets loaded, later ones conflict with it
+            if module.id in enabled:
+                enabled.remove(module.id)
+                intents.value |= module.manifest.intents.value
+        return intents
+
     async def on_connect(self) -> None:
         if self.tui is not None:
             self.tui.online = True
@@ -231,25 +314,42 @@ class Bot(commands.Bot):
         _logger.info('Shutting down bot')
         await super().close()
         if self.ready:
-            self.save_settings()
+            await asyncio.to_thread(self.save_settings)
         else:
             _logger.warning('Bot not ready, settings have not been saved')
         root_logger = logging.getLogger()
         for handler in root_logger.handlers:
             handler.close()
         root_logger.handlers.clear()
+        if self._log_listener is not None:
+            # Stopping the listener waits for any queued records to be handled
+            self._log_listener.stop()
+            for handler in self._log_listener.handlers:
+                # Closing a memory handler flushes it, but leaves its target open
+                target = handler.target if isinstance(handler, TimedMemoryHandler) else None
+                handler.close()
+                if target is not None:
+                    target.close()
+            self._log_listener = None
 
     async def is_owner(self, user: discord.User, /) -> bool:
         if user.id == self.owner_id or user.id in self.owner_ids:
             return True
+        return user.id in await self._application_owner_ids()
+
+    async def _application_owner_ids(self) -> frozenset[int]:
+        # Application ownership rarely changes, so avoid an API request every time a non-owner is checked
+        max_age = 300
+        if self._application_owners is not None and time.monotonic() - self._application_owners[0] < max_age:
+            return self._application_owners[1]
 
         app_info = await self.application_info()
         if app_info.team:
-            self.owner_ids = ids = {member.id for member in app_info.team.members}
-            return user.id in ids
-
-        self.owner_id = owner_id = app_info.owner.id
-        return user.id == owner_id
+            owner_ids = frozenset(member.id for member in app_info.team.members)
+        else:
+            owner_ids = frozenset((app_info.owner.id,))
+        self._application_owners = (time.monotonic(), owner_ids)
+        return owner_ids
 
     async def get_context(
         self,
@@ -272,17 +372,19 @@ class Bot(commands.Bot):
         if origin.author.id == self.user.id:
             return ctx
 
-        prefix = await self.get_prefix(origin)
-        if origin.content.lower().startswith(tuple(p.lower() for p in prefix)):
-            # Upon success `skip_string` will remove the prefix from the view
-            invoked_prefix = discord.utils.find(
-                StringView(origin.content.lower()).skip_string,
-                prefix,
-            )
-            view = StringView(origin.content[len(invoked_prefix):])
-            ctx = cls(view=view, bot=self, message=origin)
-        else:
+        prefix = tuple(await self.get_prefix(origin))
+        if (lowered_prefix := self._lowered_prefixes.get(prefix)) is None:
+            lowered_prefix = self._lowered_prefixes[prefix] = tuple(p.lower() for p in prefix)
+        # Only the start of the message can match a prefix, so there's no need to lowercase all of it
+        content_start = origin.content[:max(map(len, prefix), default=0)].lower()
+        invoked_prefix = next(
+            (p for p, lowered in zip(prefix, lowered_prefix, strict=True) if content_start.startswith(lowered)),
+            None,
+        )
+        if invoked_prefix is None:
             return ctx
+        view = StringView(origin.content[len(invoked_prefix):])
+        ctx = cls(view=view, bot=self, message=origin)
 
         if self.strip_after_prefix:
             view.skip_ws()
@@ -297,25 +399,40 @@ class Bot(commands.Bot):
         if file_path is None:
             file_path = self.settings_file
         _logger.info(f'Loading settings from {Path(file_path).as_posix()}')
+        self._apply_settings(config.load_toml(file_path))
 
+    def _apply_settings(self, data: dict[str, Any]) -> None:
         settings = config.SettingsGroup(
             'settings',
-            schema_path=module_path / 'settings_schema.toml',
+            schema_path=settings_schema_path,
             observers=self.settings.observers,
         )
-        settings.update_from_dict(config.load_toml(file_path), strict=False)
-        for module in self.modules:
-            module.load_settings_schema()
+        settings.update_from_dict(data, strict=False)
 
+        # Module schemas are applied to self.settings, so the new tree has to be in place first.
+        # Only loaded modules get their schema applied, so that disabled modules are still shown as such.
         self.settings = settings
+        for module in self.modules:
+            if module.loaded:
+                module.load_settings_schema()
 
     def save_settings(self, file_path: str | PathLike[str] | None = None) -> None:
-        path = self.settings_file if file_path is None else Path(file_path)
+        # Resolved so that a symlinked settings file has its target replaced, rather than the link itself
+        path = (self.settings_file if file_path is None else Path(file_path)).resolve()
+        output = (self.settings.as_toml().as_string().rstrip() + '\n').encode('utf-8')
+        if path.is_file() and path.read_bytes() == output:
+            _logger.debug(f'Settings at {path.as_posix()} are unchanged, skipping save')
+            return
         _logger.info(f'Saving settings to {path.as_posix()}')
         path.parent.mkdir(parents=True, exist_ok=True)
-        output = self.settings.as_toml().as_string().rstrip() + '\n'
-        with path.open('w', encoding='utf-8') as file:
-            file.write(output)
+        # Written to a temporary file first so that a crash mid-write can't leave a truncated settings file behind
+        temp_path = path.with_name(f'{path.name}.tmp')
+        temp_path.touch()
+        if path.is_file():
+            # The settings file holds the bot token, so its permissions are kept before anything is written
+            temp_path.chmod(stat.S_IMODE(path.stat().st_mode))
+        temp_path.write_bytes(output)
+        temp_path.replace(path)
 
     async def load_module(self, module: Module) -> None:
         await self.load_extension(module.import_string, module=module)
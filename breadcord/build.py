@@ -1,4 +1,5 @@
 import argparse
+import os
 import random
 import zipfile
 from collections import deque
@@ -58,20 +59,26 @@ def build(module_path: Path) -> None:
 
         try:
             with zipfile.ZipFile(file=output_path, mode='w', compression=zipfile.ZIP_LZMA) as archive:
-                file_queue = deque(module_path.iterdir())
+                # Every entry path starts with the module path, so relative paths can just be sliced off
+                prefix_length = len(os.path.join(module_path, ''))  # noqa: PTH118
+                output_file = str(output_path)
+                with os.scandir(module_path) as entries:
+                    file_queue = deque(entries)
                 while file_queue:
-                    file = file_queue.popleft()
+                    entry = file_queue.popleft()
+                    relative_path = entry.path[prefix_length:]
 
-                    if should_ignore(file.as_posix()) or file == output_path:
-                        zip_bomb_warning = '[bright_magenta] (oops, zip bomb!)' if file == output_path else ''
-                        console.print(f'[blue]│ [red]- {escape(str(file.relative_to(module_path)))}{zip_bomb_warning}')
+                    if should_ignore(entry.path) or entry.path == output_file:
+                        zip_bomb_warning = '[bright_magenta] (oops, zip bomb!)' if entry.path == output_file else ''
+                        console.print(f'[blue]│ [red]- {escape(relative_path)}{zip_bomb_warning}')
                         continue
 
-                    if file.is_dir():
-                        file_queue.extendleft(file.iterdir())
+                    if entry.is_dir():
+                        with os.scandir(entry.path) as entries:
+                            file_queue.extendleft(entries)
 
-                    console.print(f'[blue]│ [green]+ {escape(str(file.relative_to(module_path)))}')
-                    archive.write(file, arcname=file.relative_to(module_path))
+                    console.print(f'[blue]│ [green]+ {escape(relative_path)}')
+                    archive.write(entry.path, arcname=relative_path)
 
         except BaseException:
             console.print('[blue]X [red]Build interrupted, deleting build output')
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
-from functools import partial, wraps
+import tomllib
+from functools import lru_cache, partial, wraps
 from logging import getLogger
-from typing import TYPE_CHECKING, Any, Generic, Literal, TypeVar, cast, overload
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar, Generic, Literal, TypeVar, cast, overload
 
 import tomlkit
 import tomlkit.items
 from tomlkit import TOMLDocument
 from tomlkit.items import Comment, Item, Key, Table, Whitespace
-from tomlkit.toml_file import TOMLFile
 
 if TYPE_CHECKING:
     from collections.abc import Callable, Generator, KeysView, ValuesView
@@ -33,6 +34,11 @@ class SettingsNode:
     :param in_schema: Whether the node is present in the settings schema.
     """
 
+    __slots__ = ('_key', '_path', '_path_id', '_path_generation', '_parent', 'description', 'in_schema')
+
+    # Bumped whenever a node is moved, which invalidates every cached path since descendants' paths change with it
+    _tree_generation: ClassVar[int] = 0
+
     def __init__(
         self,
         key: str,
@@ -42,7 +48,9 @@ class SettingsNode:
         in_schema: bool = False,
     ):
         self._key = key
-        self._path = (self,)
+        self._path: tuple[SettingsNode, ...] = ()
+        self._path_id = ''
+        self._path_generation = -1
 
         self.description = description
         self.parent = parent
@@ -56,24 +64,40 @@ class SettingsNode:
         """The identifier used for this node by the parent node in the settings tree."""
         return self._key
 
+    @property
+    def parent(self) -> SettingsGroup | None:
+        """The parent node, or ``None`` if it is a root node."""
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent: SettingsGroup | None) -> None:
+        self._parent = parent
+        SettingsNode._tree_generation += 1
+
     def path(self) -> tuple[SettingsNode | Setting | SettingsGroup, ...]:
         """Return a series of node references representing the path to this node from the root node."""
-        if self.parent is None:
-            return (self,)
-        return *self.parent.path(), self
-
-    def path_id(self):
+        if self._path_generation != SettingsNode._tree_generation:
+            nodes = []
+            node: SettingsNode | None = self
+            while node is not None:
+                nodes.append(node)
+                node = node.parent
+            self._path = tuple(reversed(nodes))
+            self._path_id = '.'.join(node.key for node in self._path)
+            self._path_generation = SettingsNode._tree_generation
+        return self._path
+
+    def path_id(self) -> str:
         """Return a string identifier representing the path to this node from the root node."""
-        return '.'.join(node.key for node in self.path())
+        self.path()
+        return self._path_id
 
     def root(self) -> SettingsGroup:
         """Return the root node of the settings tree this node belongs to.
 
         This method is equivalent to calling ``node.path()[0]``.
         """
-        node = self
-        while node.parent is not None:
-            node = node.parent
+        node = self.path()[0]
         # This should never be possible, but we want the type checker to be happy :D
         if __debug__ and not isinstance(node, SettingsGroup):
             raise ValueError('root node is not a SettingsGroup')
@@ -96,6 +120,17 @@ class Setting(SettingsNode, Generic[_T]):
     :param in_schema: Whether the setting is present in the settings schema.
     """
 
+    __slots__ = (
+        '_value',
+        '_observers',
+        '_observer_mapping',
+        '_observer_path_id',
+        '_observers_seen',
+        '_has_always_trigger',
+        '_group_observers',
+        'type',
+    )
+
     def __init__(
         self,
         key: str,
@@ -109,6 +144,12 @@ class Setting(SettingsNode, Generic[_T]):
         super().__init__(key=key, description=description, parent=parent, in_schema=in_schema)
 
         self._value: _T = value
+        self._observers: list[Callable[[Any, Any], None]] = []
+        self._observer_mapping: dict[str, list[Callable[..., None]]] | None = None
+        self._observer_path_id = ''
+        self._observers_seen = 0
+        self._has_always_trigger = False
+        self._group_observers: list[list[Callable[[Setting, Any, Any], None]]] = []
 
         self.type: type = type(value)
 
@@ -120,25 +161,29 @@ class Setting(SettingsNode, Generic[_T]):
     @value.setter
     def value(self, new_value: _T) -> None:
         """Assign a new value to the setting, validating the new value type and triggering necessary observers."""
-        if isinstance(new_value, int) and self.type == float:  # noqa: E721
-            new_value = float(new_value)
-        if not isinstance(new_value, self.type):
-            raise TypeError(
-                f"Cannot assign type '{type(new_value).__name__}' to setting with type '{self.type.__name__}' "
-                f"({self.path_id()})",
-            )
+        # Values of exactly the setting's type are by far the most common, and need no further checks
+        if type(new_value) is not self.type:
+            if isinstance(new_value, int) and self.type == float:  # noqa: E721
+                new_value = float(new_value)
+            if not isinstance(new_value, self.type):
+                raise TypeError(
+                    f"Cannot assign type '{type(new_value).__name__}' to setting with type '{self.type.__name__}' "
+                    f"({self.path_id()})",
+                )
 
         old_value = self._value
         self._value = new_value
 
-        root_observers = self.root().observers
-        if root_observers is None:
-            raise ValueError('root node does not have observer mapping')
-        path_id = self.path_id()
-        if path_id not in root_observers:
-            return
-        for observer in root_observers[path_id]:
-            observer(old_value, new_value)
+        observers = self._get_observers()
+        changed = old_value != new_value
+        # Other observers ignore equal values anyway, so they don't even need to be called
+        if changed or self._has_always_trigger:
+            for observer in observers:
+                observer(old_value, new_value)
+        if changed:
+            for group_observers in self._group_observers:
+                for observer in group_observers:
+                    observer(self, old_value, new_value)
 
     def observe(
         self,
@@ -164,15 +209,32 @@ class Setting(SettingsNode, Generic[_T]):
                 return
             observer(old, new)
 
+        wrapper.always_trigger = always_trigger  # type: ignore[attr-defined]
+        self._get_observers().append(wrapper)
+        return wrapper
+
+    def _get_observers(self) -> list[Callable[[Any, Any], None]]:
         observers = self.root().observers
         if observers is None:
             raise ValueError('root node does not have observer mapping')
         path_id = self.path_id()
-        if path_id not in observers:
-            observers[path_id] = []
-        observers[path_id].append(wrapper)
-
-        return wrapper
+        # The list is only looked up again if the setting has moved or the observer mapping has been replaced
+        if observers is not self._observer_mapping or path_id is not self._observer_path_id:
+            self._observers = observers.setdefault(path_id, [])
+            self._observer_mapping = observers
+            self._observer_path_id = path_id
+            self._observers_seen = 0
+            self._has_always_trigger = False
+            self._group_observers = [
+                observers.setdefault(group._group_observers_key(), []) for group in self.path()[:-1]
+            ]
+        # Observers are only ever appended, possibly via another node sharing the list, so only new ones are checked
+        if len(self._observers) != self._observers_seen:
+            self._has_always_trigger |= any(
+                getattr(observer, 'always_trigger', False) for observer in self._observers[self._observers_seen:]
+            )
+            self._observers_seen = len(self._observers)
+        return self._observers
 
 
 class SettingsGroup(SettingsNode):
@@ -190,6 +252,8 @@ class SettingsGroup(SettingsNode):
     :param observers: The :class:`dict` of observers to assign the node. Should only be specified for root nodes.
     """
 
+    __slots__ = ('_settings', '_children', 'observers')
+
     def __init__(
         self,
         key: str,
@@ -199,7 +263,7 @@ class SettingsGroup(SettingsNode):
         parent: SettingsGroup | None = None,
         in_schema: bool = False,
         schema_path: str | PathLike[str] | None = None,
-        observers: dict[str, list[Callable[[Any, Any], None]]] | None = None,
+        observers: dict[str, list[Callable[..., None]]] | None = None,
     ) -> None:
 
         self._settings: dict[str, Setting] = {setting.key: setting for setting in settings or ()}
@@ -219,8 +283,11 @@ class SettingsGroup(SettingsNode):
         )
 
     def __getattr__(self, item: str) -> Setting | SettingsGroup:
-        if item in self._children:
-            return self.get_child(item)
+        # Python and libraries probe for dunder methods through here, which are never settings
+        if item.startswith('__'):
+            raise AttributeError(f'{self.__class__.__name__!r} object has no attribute {item!r}')
+        if (child := self._children.get(item)) is not None:
+            return child
         return self._settings[item]
 
     def __contains__(self, item: str) -> bool:
@@ -228,7 +295,7 @@ class SettingsGroup(SettingsNode):
             raise TypeError(
                 f"'in <{self.__class__.__name__}>' requires string as left operand, not '{type(item).__name__}'",
             )
-        return item in self.keys()
+        return item in self._settings
 
     def __iter__(self) -> Generator[Setting, None, None]:
         yield from self._settings.values()
@@ -248,11 +315,16 @@ class SettingsGroup(SettingsNode):
         :param skip_groups: Whether :cls:`SettingsGroup` objects should be skipped
         :param skip_settings: Whether :cls:`Setting` objects should be skipped
         """
-        discovered: list[SettingsNode] = [] if skip_groups else [self]
-        if not skip_settings:
-            discovered.extend(self)
-        for child in self.children():
-            discovered.extend(child.walk(skip_groups=skip_groups, skip_settings=skip_settings))
+        discovered: list[SettingsNode] = []
+        # Children are pushed in reverse so they are popped in order, keeping the result depth-first
+        stack = [self]
+        while stack:
+            group = stack.pop()
+            if not skip_groups:
+                discovered.append(group)
+            if not skip_settings:
+                discovered.extend(group._settings.values())
+            stack.extend(reversed(group._children.values()))
         return discovered
 
     @overload
@@ -285,44 +357,42 @@ class SettingsGroup(SettingsNode):
         :param body: The parsed TOML body data to interpret as. Overrides loading from ``file_path`` when present.
         """
         if body is None and file_path is not None:
-            parsed_body = TOMLFile(file_path).read().body
+            parsed_body = read_toml_document(file_path).body
         elif body is not None:
             parsed_body = body
         else:
             raise ValueError('either file_path or body must be specified')
 
-        parsed_body.append((None, Whitespace('')))
-
-        chunk = []
-        for item in parsed_body:
-            chunk.append(item)
-            if item[0] is None:
+        # Comments are collected until the key-value pair they describe is reached
+        description: list[str] = []
+        for key, item in parsed_body:
+            if key is None:
+                if isinstance(item, Comment):
+                    description.append(_comment_text(item))
                 continue
 
-            setting = parse_schema_chunk(chunk)
-            if setting.type == dict:  # noqa: E721
-                group = self.get_child(setting.key, allow_new=True)
-                group.description = setting.description
+            description_text = ''.join(description).rstrip()
+            if isinstance(item, tomlkit.items.AbstractTable):
+                group = self.get_child(key.key, allow_new=True)
+                group.description = description_text
                 group.in_schema = True
-                table_document = tomlkit.loads(chunk[-1][1].as_string())
-                group.load_schema(body=table_document.body)
+                group.load_schema(body=item.value.body)
                 self.add_child(group)
             else:
-                setting.parent = self
-                if setting.key in self:
-                    setting.value = self._settings[setting.key].value
-                self._settings[setting.key] = setting
+                value = item.unwrap()
+                existing = self._settings.get(key.key)
+                # An existing setting of the same type already holds a valid value, so only its metadata is updated
+                if existing is not None and existing.type is type(value):
+                    existing.description = description_text
+                    existing.in_schema = True
+                else:
+                    setting = Setting(key.key, value, description=description_text, parent=self, in_schema=True)
+                    if existing is not None:
+                        setting.value = existing.value
+                    self._settings[key.key] = setting
 
-            next_chunk: list[tuple[Key | None, Item]] = []
             # This is required as comments after a table are considered a child of the table
-            if isinstance(chunk[-1][1], tomlkit.items.Table):
-                for line in reversed(chunk[-1][1].as_string().splitlines()):
-                    if line.startswith('#'):
-                        next_chunk.append((None, tomlkit.comment(line.lstrip('# '))))
-                    elif line.strip():
-                        break
-                next_chunk.reverse()
-            chunk = next_chunk
+            description = _trailing_comments(item) if isinstance(item, Table) else []
 
     def get(self, key: str, default: _T = None) -> Setting | _T:
         """Get a :class:`Setting` object by its key.
@@ -343,16 +413,14 @@ class SettingsGroup(SettingsNode):
         :param value: The new value to set for the setting.
         :param strict: Whether :class:`KeyError` should be thrown when the key doesn't exist in the schema.
         """
-        if strict and (
-            key not in self
-            or not self._settings[key].in_schema
-        ):
+        setting = self._settings.get(key)
+        if strict and (setting is None or not setting.in_schema):
             raise ValueError(f'{self.path_id()}.{key} is not declared in the schema')
 
-        if key not in self:
+        if setting is None:
             self._settings[key] = Setting(key, value, parent=self, in_schema=False)
         else:
-            self._settings[key].value = value
+            setting.value = value
 
     def get_child(self, key: str, allow_new: bool = False) -> SettingsGroup:
         """Get a child :class:`SettingsGroup` object by its key.
@@ -367,6 +435,31 @@ class SettingsGroup(SettingsNode):
             self.add_child(SettingsGroup(key))
         return self._children[key]
 
+    def observe(
+        self,
+        observer: Callable[[Setting, Any, Any], Any] | None = None,
+    ) -> Callable[..., Any]:
+        """Register an observer function which is called whenever a setting anywhere under this group is updated.
+
+        Unlike :meth:`Setting.observe`, the observer is only called when the value actually changes.
+        This method can be used as a decorator, with optional parentheses.
+
+        :param observer: The callback function. Takes three parameters ``setting``, ``old`` and ``new``, which
+            correspond to the updated setting and its value before and after it is updated respectively.
+        """
+        if observer is None:
+            return self.observe
+
+        observers = self.root().observers
+        if observers is None:
+            raise ValueError('root node does not have observer mapping')
+        observers.setdefault(self._group_observers_key(), []).append(observer)
+        return observer
+
+    def _group_observers_key(self) -> str:
+        # Stored alongside setting observers, the trailing dot keeps the key from matching any setting's path
+        return f'{self.path_id()}.'
+
     def add_child(self, child: SettingsGroup) -> None:
         """Set a child :class:`SettingsGroup` object as a child node to the current node.
 
@@ -446,21 +539,60 @@ def parse_schema_chunk(chunk: list[tuple[Key | None, Item]]) -> Setting:
 
     :param chunk: A sub-list of TOMLDocument.body. Must contain one key-value pair.
     """
-    chunk = chunk.copy()
+    description = []
+    for key, item in chunk:
+        if key is not None:
+            break
+        if isinstance(item, Comment):
+            description.append(_comment_text(item))
+
+    return Setting(key.key, item.unwrap(), description=''.join(description).rstrip(), in_schema=True)
+
 
-    description = ''
-    while chunk[0][0] is None:
-        if isinstance(chunk[0][1], Comment):
-            description += chunk[0][1].indent(0).as_string().lstrip('# ')
-        chunk.pop(0)
+def _comment_text(comment: Comment) -> str:
+    # Read straight from the trivia, since indent(0) would modify the document, which may be a cached one
+    return comment.trivia.comment.lstrip('# ') + comment.trivia.trail
 
-    return Setting(chunk[0][0].key, chunk[0][1].unwrap(), description=description.rstrip(), in_schema=True)
+
+def _trailing_comments(table: Table) -> list[str]:
+    """Get the text of the comments at the end of a table, including those at the end of its last nested table."""
+    comments = []
+    for _, item in reversed(table.value.body):
+        if isinstance(item, Comment):
+            comments.append(_comment_text(item))
+        elif isinstance(item, Table):
+            comments.extend(reversed(_trailing_comments(item)))
+            break
+        elif not isinstance(item, Whitespace):
+            break
+    comments.reverse()
+    return comments
+
+
+@lru_cache(maxsize=64)
+def _parse_toml_file(file_path: Path, _mtime_ns: int, _size: int) -> TOMLDocument:
+    return tomlkit.loads(file_path.read_bytes().decode('utf-8'))
+
+
+def read_toml_document(file_path: str | PathLike[str]) -> TOMLDocument:
+    """Read and parse a TOML file, reusing the previous result if the file has not changed since it was last read.
+
+    The returned document is shared between callers, so it must not be modified in place.
+
+    :param file_path: Path to the TOML file.
+    """
+    path = Path(file_path).resolve()
+    stat = path.stat()
+    return _parse_toml_file(path, stat.st_mtime_ns, stat.st_size)
 
 
 def load_toml(file_path: str | PathLike[str]) -> dict[str, Any]:
-    """Load and deserialise a TOML file into a :class:`TOMLDocument` instance.
+    """Load and deserialise a TOML file into a :class:`dict`.
+
+    This uses :mod:`tomllib` rather than tomlkit, since formatting and comments aren't needed for plain data.
 
     :param file_path: Path to the TOML file.
     :returns: A dict structure representing the hierarchy of the TOML document.
     """
-    return TOMLFile(file_path).read().unwrap()
+    with open(file_path, 'rb') as file:
+        return tomllib.load(file)
@@ -15,6 +15,7 @@ from breadcord.module import Module  # noqa: TCH001
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
+    from os import PathLike
 
 
 class ModulesConverter(commands.Converter):
@@ -63,6 +64,19 @@ async def git(*command_arguments: str, timeout: float = 10, **kwargs: Any) -> st
     return stdout.decode()
 
 
+async def upstream_branch(path: str | PathLike[str]) -> tuple[str, str] | None:
+    """Get the remote name and remote ref tracked by the checked out branch, or ``None`` if it doesn't track one."""
+    branches = await git(
+        'for-each-ref', '--format=%(HEAD) %(upstream:remotename) %(upstream:remoteref)', 'refs/heads',
+        cwd=path,
+    )
+    for line in branches.splitlines():
+        current, remote, remote_ref = line.split(' ', 2)
+        if current == '*':
+            return (remote, remote_ref) if remote and remote_ref else None
+    return None
+
+
 class AutoUpdate(breadcord.module.ModuleCog):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -98,12 +112,20 @@ class AutoUpdate(breadcord.module.ModuleCog):
 
         updated_modules = {}
         self.logger.info('Attempting to update modules')
-        for module in self.bot.modules:
-            if module.id not in to_update:
-                continue
-            if not module_ids and not module.loaded:
-                continue
-            if not await self.should_update(module):
+        candidates = [
+            module for module in self.bot.modules
+            if module.id in to_update and (module_ids or module.loaded)
+        ]
+        # Checking for updates is mostly waiting on the network, so remotes are fetched concurrently
+        semaphore = asyncio.Semaphore(8)
+
+        async def check(module: Module) -> bool:
+            async with semaphore:
+                return await self.should_update(module)
+
+        outdated = await asyncio.gather(*map(check, candidates))
+        for module, should_update in zip(candidates, outdated, strict=True):
+            if not should_update:
                 continue
             try:
                 pull_msg, commit_hash, commit_msg = await self.update_module(module, colour=colour)
@@ -122,9 +144,11 @@ class AutoUpdate(breadcord.module.ModuleCog):
         if not (module.path / '.git' / 'HEAD').is_file():
             return False
         try:
-            await git('fetch', cwd=module.path)
-            ahead = (await git('rev-list', '--count', '@{u}..HEAD', cwd=module.path)).strip()
-            behind = (await git('rev-list', '--count', 'HEAD..@{u}', cwd=module.path)).strip()
+            # Only the tracked branch is fetched, rather than every branch of the remote
+            upstream = await upstream_branch(module.path)
+            await git('fetch', *(upstream or ()), cwd=module.path)
+            # Counts commits only on the upstream (behind) and only on HEAD (ahead) in a single call
+            behind, ahead = (await git('rev-list', '--left-right', '--count', '@{u}...HEAD', cwd=module.path)).split()
         except subprocess.CalledProcessError as error:
             self.logger.error(f'Failed to check for updates for the module {module.id!r}: {error}\n{error.stderr}')
             return False
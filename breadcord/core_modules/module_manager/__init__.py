@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 import re
+import tomllib
 from http import HTTPStatus
 
 import discord
-import tomlkit
 from discord import app_commands
 from discord.ext import commands
 from discord.utils import escape_markdown
@@ -88,7 +88,7 @@ class ModuleManager(
                 return
 
             content = await response.text()
-            manifest = parse_manifest(tomlkit.loads(content).unwrap())
+            manifest = parse_manifest(tomllib.loads(content))
 
         if manifest.id in self.bot.modules:
             await interaction.response.send_message(embed=discord.Embed(
@@ -180,7 +180,7 @@ class ModuleManager(
         module: app_commands.Transform[breadcord.module.Module, ModuleTransformer],
     ):
         await module.load()
-        self.bot.settings.modules.value.append(module.id)
+        self.bot.settings.modules.value = [*self.bot.settings.modules.value, module.id]
 
         view = views.SyncSlashCommandsView(cog=self, user_id=interaction.user.id)
         await interaction.response.send_message(
@@ -204,7 +204,7 @@ class ModuleManager(
         module: app_commands.Transform[breadcord.module.Module, ModuleTransformer],
     ):
         await module.unload()
-        self.bot.settings.modules.value.remove(module.id)
+        self.bot.settings.modules.value = [m for m in self.bot.settings.modules.value if m != module.id]
 
         view = views.SyncSlashCommandsView(cog=self, user_id=interaction.user.id)
         await interaction.response.send_message(
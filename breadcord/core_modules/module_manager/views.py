@@ -124,7 +124,8 @@ class ModuleUninstallView(BaseView):
 
         if self.module.loaded:
             await self.module.unload()
-            self.cog.bot.settings.modules.value.remove(self.module.id)
+            settings = self.cog.bot.settings
+            settings.modules.value = [m for m in settings.modules.value if m != self.module.id]
         await to_thread(lambda: rmtree(self.module.path))
         self.cog.bot.modules.remove(self.module.id)
 
@@ -161,14 +162,16 @@ class ModulePostInstallView(BaseView):
             button.label = 'Enabling module...'
             await interaction.edit_original_response(view=self)
             await self.module.load()
-            self.cog.bot.settings.modules.value.append(self.module.id)
+            settings = self.cog.bot.settings
+            settings.modules.value = [*settings.modules.value, self.module.id]
             button.label = 'Disable Module'
             button.style = discord.ButtonStyle.red
         else:
             button.label = 'Disabling module...'
             await interaction.edit_original_response(view=self)
             await self.module.unload()
-            self.cog.bot.settings.modules.value.remove(self.module.id)
+            settings = self.cog.bot.settings
+            settings.modules.value = [m for m in settings.modules.value if m != self.module.id]
             button.label = 'Enable Module'
             button.style = discord.ButtonStyle.green
 
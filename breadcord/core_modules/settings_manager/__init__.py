@@ -1,4 +1,5 @@
-import aiofiles
+import asyncio
+
 import discord
 import tomlkit
 import tomlkit.exceptions
@@ -44,8 +45,7 @@ class SettingsFileEditor(discord.ui.Modal, title='Settings File Editor'):
         super().__init__()
 
     async def on_submit(self, interaction: discord.Interaction) -> None:
-        async with aiofiles.open(self.bot.settings_file, 'w', encoding='utf-8') as file:
-            await file.write(self.editor.value)
+        await asyncio.to_thread(self.bot.settings_file.write_text, self.editor.value, encoding='utf-8')
         self.bot.load_settings()
         await interaction.response.send_message(
             embed=discord.Embed(
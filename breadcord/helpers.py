@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import copy
 import inspect
 import logging
+import logging.handlers
 import re
 import sys
+import threading
 from collections import defaultdict
 from typing import TYPE_CHECKING, Self, TypeVar, overload
 
@@ -298,3 +301,47 @@ class IndentFormatter(logging.Formatter):
         indent = ' ' * self.get_prefix_length(record)
         initial, *rest = self._wrapped.format(record).splitlines(keepends=True)
         return initial + ''.join(indent + line for line in rest)
+
+
+class TimedMemoryHandler(logging.handlers.MemoryHandler):
+    """A :class:`logging.handlers.MemoryHandler` which also flushes records that have been buffered for too long.
+
+    :param capacity: The number of records to buffer before flushing them to the target.
+    :param flush_interval: The maximum number of seconds a record can stay buffered for.
+    """
+
+    def __init__(self, capacity: int, flush_interval: float = 5, **kwargs) -> None:
+        super().__init__(capacity, **kwargs)
+        self.flush_interval = flush_interval
+        self._flush_timer: threading.Timer | None = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        # Handler.handle already holds the lock here
+        if self.buffer and self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            super().flush()
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """A :class:`logging.handlers.QueueHandler` for queues that are consumed within the same process.
+
+    Unlike the base class, records keep their exception info rather than having it flattened into the message,
+    leaving the handlers on the other end of the queue free to format it however they like.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Copied since other handlers may be formatting the same record on another thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
@@ -3,17 +3,21 @@ from __future__ import annotations
 import asyncio
 import importlib.metadata
 import logging
+import os
+import re
 import shutil
 import subprocess
 import sys
+import tomllib
+from collections import defaultdict
+from functools import lru_cache
 from logging import getLogger
 from pathlib import Path
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Annotated, Any
 from zipfile import ZipFile
 
 import discord
 import pydantic
-import tomlkit
 from discord.ext import commands
 from packaging.requirements import Requirement
 from packaging.version import Version
@@ -27,6 +31,7 @@ if TYPE_CHECKING:
     from breadcord import Bot
 
 _logger = getLogger('breadcord.module')
+MODULE_ID_PATTERN = re.compile(r'^[a-z_]+$')
 
 
 class StreamLogger:
@@ -48,30 +53,40 @@ class Module:
         self,
         bot: Bot,
         module_path: str | PathLike[str],
-        import_relative_to: str | PathLike[str] = Path(),
+        import_relative_to: str | PathLike[str] | None = None,
     ) -> None:
         self.bot = bot
         self.path = Path(module_path).resolve()
-        self.import_string = self.path.relative_to(Path(import_relative_to).resolve()).as_posix().replace('/', '.')
+        import_root = Path(Path() if import_relative_to is None else import_relative_to).resolve()
+        self.import_string = self.path.relative_to(import_root).as_posix().replace('/', '.')
         self.logger = getLogger(self.import_string.removeprefix('breadcord.'))
         self.loaded = False
 
-        if not (self.path / 'manifest.toml').is_file():
-            raise FileNotFoundError('manifest.toml file not found')
-        self.manifest = parse_manifest(config.load_toml(self.path / 'manifest.toml'))
+        try:
+            self.manifest = parse_manifest(config.load_toml(self.path / 'manifest.toml'))
+        except FileNotFoundError:
+            raise FileNotFoundError('manifest.toml file not found') from None
 
         self.id = self.manifest.id
 
     @property
     def storage_path(self) -> Path:
         path = self.bot.storage_dir / self.id
-        path.mkdir(exist_ok=True)
+        if not path.is_dir():
+            path.mkdir(exist_ok=True)
         return path
 
     def __repr__(self) -> str:
         return f'{self.__class__.__name__}({self.import_string})'
 
     async def load(self) -> None:
+        missing_intents = discord.Intents.none()
+        missing_intents.value = self.manifest.intents.value & ~self.bot.intents.value
+        if missing_intents.value:
+            self.logger.warning(
+                'Module requires gateway intents which were not requested on startup, restart the bot to enable them: '
+                + ', '.join(name for name, enabled in missing_intents if enabled),
+            )
         self.load_settings_schema()
         # Some modules might fail to load because of their settings. We want to save them so the user can fix them
         self.bot.save_settings()
@@ -95,20 +110,24 @@ class Module:
         self.logger.info('Module successfully reloaded')
 
     def load_settings_schema(self) -> None:
-        if not (schema_path := self.path / 'settings_schema.toml').is_file():
+        try:
+            schema = config.read_toml_document(self.path / 'settings_schema.toml')
+        except FileNotFoundError:
             return
         settings = self.bot.settings.get_child(self.id, allow_new=True)
-        settings.load_schema(file_path=schema_path)
+        settings.load_schema(body=list(schema.body))
         settings.in_schema = True
 
     async def install_requirements(self) -> None:
-        installed_distributions = tuple(importlib.metadata.distributions())
+        # Modules are loaded concurrently, so avoid blocking the event loop scanning installed packages for nothing
+        if not self.manifest.requirements:
+            return
+        installed_versions: defaultdict[str, list[str]] = defaultdict(list)
+        for distribution in importlib.metadata.distributions():
+            installed_versions[distribution.name].append(distribution.version)
 
         def is_missing(requirement: Requirement) -> bool:
-            for distribution in installed_distributions:
-                if requirement.name == distribution.name and distribution.version in requirement.specifier:
-                    return False
-            return True
+            return not any(version in requirement.specifier for version in installed_versions.get(requirement.name, ()))
 
         missing_requirements: tuple[Requirement, ...] = tuple(filter(is_missing, self.manifest.requirements))
         if not missing_requirements:
@@ -187,7 +206,7 @@ class Modules:
         install_path = Path(install_path)
 
         with ZipFile(loaf_path, mode='r') as archive:
-            manifest = parse_manifest(tomlkit.loads(archive.read('manifest.toml')).unwrap())
+            manifest = parse_manifest(tomllib.loads(archive.read('manifest.toml').decode('utf-8')))
             module_path = install_path / manifest.id
             archive.extractall(module_path)
             module = Module(bot, module_path)
@@ -200,23 +219,40 @@ class Modules:
         self,
         bot: Bot,
         search_path: str | PathLike[str],
-        import_relative_to: str | PathLike[str] = Path(),
+        import_relative_to: str | PathLike[str] | None = None,
     ) -> None:
-        path = Path(search_path).resolve()
+        for module in find_modules(bot, search_path, import_relative_to):
+            _logger.debug(f'Discovered module: {module.import_string}')
+            self.add(module)
 
-        if not path.is_dir():
-            raise FileNotFoundError(f"module path '{path.as_posix()}' not found")
 
-        for module_path in [path, *list(path.iterdir())]:
-            if not (module_path / 'manifest.toml').is_file():
-                continue
+def find_modules(
+    bot: Bot,
+    search_path: str | PathLike[str],
+    import_relative_to: str | PathLike[str] | None = None,
+) -> list[Module]:
+    """Find the module at a search path, or the modules in its immediate subdirectories.
 
-            module = Module(bot, module_path, import_relative_to=import_relative_to)
-            _logger.debug(f'Discovered module: {module.import_string}')
-            self.add(module)
+    :param bot: The bot the modules belong to.
+    :param search_path: Either a module directory, or a directory containing module directories.
+    :param import_relative_to: The directory the modules' import strings are relative to, the working directory if
+        not specified.
+    """
+    path = Path(search_path).resolve()
+
+    if not path.is_dir():
+        raise FileNotFoundError(f"module path '{path.as_posix()}' not found")
 
-            if module_path == path:
-                break
+    if (path / 'manifest.toml').is_file():
+        return [Module(bot, path, import_relative_to=import_relative_to)]
+
+    # DirEntry caches the file type from the directory listing, so non-directories are skipped without a stat
+    with os.scandir(path) as entries:
+        return [
+            Module(bot, entry.path, import_relative_to=import_relative_to)
+            for entry in entries
+            if entry.is_dir() and os.path.isfile(os.path.join(entry.path, 'manifest.toml'))  # noqa: PTH113, PTH118
+        ]
 
 
 class ModuleCog(commands.Cog):
@@ -239,40 +275,40 @@ class ModuleCog(commands.Cog):
 # PyCharm complains about having @classmethod underneath @pydantic.field_validator
 # noinspection PyNestedDecorators
 class ModuleManifest(pydantic.BaseModel):
-    class Config:
-        arbitrary_types_allowed = True
+    model_config = pydantic.ConfigDict(arbitrary_types_allowed=True)
 
     is_core_module: bool = False
-    id: pydantic.constr(
+    id: Annotated[str, pydantic.StringConstraints(
         strip_whitespace=True,
         min_length=1,
         max_length=32,
-        pattern=r'^[a-z_]+$',
-    )
-    name: pydantic.constr(
+        pattern=MODULE_ID_PATTERN,
+    )]
+    name: Annotated[str, pydantic.StringConstraints(
         strip_whitespace=True,
         min_length=1,
         max_length=64,
-    )
-    description: pydantic.constr(
+    )]
+    description: Annotated[str, pydantic.StringConstraints(
         strip_whitespace=True,
         min_length=1,
         max_length=128,
-    ) = ''
+    )] = ''
     version: Version | None = None
     # TODO: add SPDX license validation to the license field
-    license: pydantic.constr(
+    license: Annotated[str, pydantic.StringConstraints(
         strip_whitespace=True,
         min_length=1,
         max_length=64,
-    ) = 'No license specified'
-    authors: list[pydantic.constr(
+    )] = 'No license specified'
+    authors: list[Annotated[str, pydantic.StringConstraints(
         strip_whitespace=True,
         min_length=1,
         max_length=32,
-    )] = []
+    )]] = []
     requirements: list[Requirement] = []
     permissions: discord.Permissions = discord.Permissions.none()
+    intents: discord.Intents = discord.Intents.none()
 
     @pydantic.model_validator(mode='after')
     def validate_core_module(self) -> ModuleManifest:
@@ -286,7 +322,7 @@ class ModuleManifest(pydantic.BaseModel):
     @pydantic.field_validator('version', mode='before')
     @classmethod
     def parse_version(cls, value: str) -> Version:
-        return Version(value)
+        return _parse_version(value)
 
     @pydantic.field_validator('requirements', mode='before')
     @classmethod
@@ -298,16 +334,29 @@ class ModuleManifest(pydantic.BaseModel):
     def parse_permissions(cls, value: list[str]) -> discord.Permissions:
         return discord.Permissions(**{permission: True for permission in value})
 
+    @pydantic.field_validator('intents', mode='before')
+    @classmethod
+    def parse_intents(cls, value: list[str]) -> discord.Intents:
+        # discord.py raises TypeError for unknown flags, which pydantic wouldn't turn into a validation error
+        try:
+            return discord.Intents(**{intent: True for intent in value})
+        except TypeError as error:
+            raise ValueError(str(error)) from None
+
+
+# Manifests are parsed again whenever modules are discovered, e.g. each time the bot is restarted from the TUI
+@lru_cache(maxsize=256)
+def _parse_version(version: str) -> Version:
+    return Version(version)
+
 
 def parse_manifest(manifest: dict[str, Any]) -> ModuleManifest:
-    match manifest:
-        case {'core_module': data}:
-            return ModuleManifest(**data, is_core_module=True)
-        case {'manifest_version': 1, **data}:
-            flattened_data: dict[str, Any] = data['module']
-            return ModuleManifest(**flattened_data)
-        case _:
-            raise ValueError('invalid manifest version')
+    if 'core_module' in manifest:
+        return ModuleManifest.model_validate({**manifest['core_module'], 'is_core_module': True})
+    if manifest.get('manifest_version') == 1:
+        flattened_data: dict[str, Any] = manifest['module']
+        return ModuleManifest.model_validate(flattened_data)
+    raise ValueError('invalid manifest version')
 
 
 global_modules = Modules()